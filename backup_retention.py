@@ -1,44 +1,103 @@
 import os
 import sys
 import argparse
-import math
+import functools
 from datetime import datetime
-from glob import glob
+from operator import itemgetter
 import re
-import shutil
 
 def get_matching_files(directory, file_format):
     """
-    Retrieve a list of files in the specified directory that match the given file format.
+    Retrieve a list of files in the specified directory that match the given file format, along with their datetime.
 
     Args:
         directory (str): The directory path where the files will be searched.
         file_format (str): The file format pattern to match. Use "{YYYY}" for year,
             "{MM}" for month, "{DD}" for day, "{hh}" for hour, and "{mm}" for minute.
-            Any of these placeholders will be replaced with "*" in the file pattern.
             Literal characters as well as wildcards * and ? may of course also be added.
 
     Returns:
-        list: A list of file paths that match the specified file format.
+        list: A list of (file path, datetime) tuples for the files that match the specified file format.
+            The datetime is None if the date/time in the file name is invalid (for example month 13).
 
     Example:
         directory = "/path/to/files"
         file_format = "data_{YYYY}{MM}{DD}.txt"
         matching_files = get_matching_files(directory, file_format)
-        # Returns a list of files in the directory that match the format "data_YYYYMMDD.txt".
+        # Returns a list of files in the directory that match the format "data_YYYYMMDD.txt", like
+        # [('/path/to/files/data_20230517.txt', datetime.datetime(2023, 5, 17, 0, 0)), ...]
 
     Note:
         - The file format should follow the specified placeholders for year, month, day, hour, and minute.
         - Any other parts of the file format will be treated as literal characters.
-        - The function uses the `glob` module to find files based on the generated file pattern.
+        - If the file format contains only one directory level, the directory is listed with `os.scandir`,
+          otherwise the `glob` module is used to find the paths matching all levels of the format.
+        - Each name is matched against the regex generated from the file format once, and the datetime
+          is taken from that same match, so get_file_datetime doesn't have to be called for each file.
 
     """
+    return list(iter_matching_files(directory, file_format))
+
+def iter_matching_files(directory, file_format):
+    """
+    Generator version of get_matching_files, yielding (file path, datetime) tuples while the directory
+    is being listed, so the files can be processed in the same pass without building a list first.
+    """
+    format_regex = _compiled_format_regex(file_format)
+    if "/" in file_format:
+        # the format spans several directory levels, for example "{YYYY}/{MM}/{DD}", so let glob find them
+        from glob import iglob # only needed for formats with several levels, so it's not imported at startup
+        file_pattern = _format_to_glob(file_format)
+        for path in iglob(os.path.join(directory, file_pattern)):
+            match = format_regex.fullmatch(_format_levels_of_path(path, file_format))
+            if match:
+                yield path, _datetime_from_match(match)
+    else:
+        name_length = _fixed_name_length(file_format)
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    # a name of the wrong length can't match, so the regex isn't run on it
+                    if name_length is not None and len(entry.name) != name_length:
+                        continue
+                    match = format_regex.fullmatch(entry.name)
+                    if match:
+                        yield entry.path, _datetime_from_match(match)
+        except OSError: # the directory doesn't exist or can't be read, glob would also have returned no files
+            return
+
+@functools.lru_cache(maxsize=32)
+def _format_to_glob(file_format):
+    """
+    Returns the glob pattern for the given file format, where the placeholders
+    "{YYYY}", "{MM}", "{DD}", "{hh}" and "{mm}" are replaced with "*".
+    Cached per file format, like _compiled_format_regex.
+
+    Example:
+        _format_to_glob("{YYYY}/{MM}/{DD}")
+        # "*/*/*"
+    """
     file_pattern = file_format
     for timeUnit in ["{YYYY}", "{MM}", "{DD}", "{hh}", "{mm}"]:
         if timeUnit in file_format:
             file_pattern = file_pattern.replace(timeUnit, "*")
-    files = glob(os.path.join(directory, file_pattern))
-    return files
+    return file_pattern
+
+@functools.lru_cache(maxsize=32)
+def _fixed_name_length(file_format):
+    """
+    Returns the length every name matching file_format has, or None if the format contains "*",
+    in which case the length varies. Cached per file format, like _compiled_format_regex.
+
+    Example:
+        _fixed_name_length("{YYYY}{MM}{DD}T{hh}{mm}")
+        # 13
+    """
+    if "*" in file_format:
+        return None
+    # each placeholder matches as many digits as it has letters, "?" matches a single character,
+    # and other characters match themselves, as they're escaped by generate_regex_pattern
+    return len(re.sub(r"\{(YYYY|MM|DD|hh|mm)\}", lambda placeholder: "0" * len(placeholder.group(1)), file_format))
 
 def generate_regex_pattern(file_format):
     """
@@ -54,20 +113,24 @@ def generate_regex_pattern(file_format):
     corresponding regular expression patterns. It converts "?" to a regex pattern matching
     any single character, "*" to a regex pattern matching zero or more characters, and
     "{YYYY}", "{MM}", "{DD}", "{hh}", "{mm}" to corresponding regex patterns for year,
-    month, day, hour, and minute respectively. The resulting pattern is anchored at the
-    start and end to match the entire file name.
+    month, day, hour, and minute respectively. All other characters are escaped, so they only
+    match themselves, like in the glob pattern. The resulting pattern is not anchored, use
+    fullmatch to match it against the entire file name.
 
     Examples:
         file_format = "file_*.txt"
         regex_pattern = generate_regex_pattern(file_format)
-        # regex_pattern = r"^file_\w*\.txt$"
+        # regex_pattern = r"file_\w*\.txt"
         
         file_format = '{YYYY}{MM}{DD}T{hh}{mm}'
         regex_pattern = generate_regex_pattern(file_format)
-        # regex_pattern = '^(?P<YYYY>\\d{4})(?P<MM>\\d{2})(?P<DD>\\d{2})T(?P<hh>\\d{2})(?P<mm>\\d{2})$'
+        # regex_pattern = '(?P<YYYY>\\d{4})(?P<MM>\\d{2})(?P<DD>\\d{2})T(?P<hh>\\d{2})(?P<mm>\\d{2})'
 
     """
-    regex_pattern = file_format
+    # Escape the literal characters between the placeholders and wildcards, so for example
+    # the "." in "data_{YYYY}{MM}{DD}.txt" only matches a dot, and not any character
+    parts = re.split(r"(\{(?:YYYY|MM|DD|hh|mm)\}|[?*])", file_format) # the placeholders and wildcards are the odd items
+    regex_pattern = "".join(part if i % 2 else re.escape(part) for i, part in enumerate(parts))
     # Replace ? with regex pattern matching any single character
     regex_pattern = regex_pattern.replace("?", r"\w")
     # Replace * with regex pattern matching zero or more characters
@@ -78,12 +141,32 @@ def generate_regex_pattern(file_format):
     regex_pattern = regex_pattern.replace("{DD}", r"(?P<DD>\d{2})")
     regex_pattern = regex_pattern.replace("{hh}", r"(?P<hh>\d{2})")
     regex_pattern = regex_pattern.replace("{mm}", r"(?P<mm>\d{2})")
-    # Add end anchor to match the entire file/path name after the capture group
-    # anything before the capture group is ignored, so any path name given will match
-    # for example, given the file format "{YYYY}{MM}{DD}T{hh}{mm}", the file name "../subdir/20220523T0830.txt" will match
-    regex_pattern = regex_pattern + r"$"
+    # No anchors are added, the pattern is matched with fullmatch, which requires the entire name to match
+    # for paths, only the last directory levels are matched (see _format_levels_of_path), so given the
+    # file format "{YYYY}{MM}{DD}T{hh}{mm}", the file name "../subdir/20220523T0830" will match
     return regex_pattern
 
+@functools.lru_cache(maxsize=32)
+def _compiled_format_regex(file_format):
+    """
+    Returns the compiled regular expression for the given file format.
+
+    The result is cached per file format, so the pattern is only generated and compiled
+    once per run, rather than once for every file that is checked against it.
+    """
+    return re.compile(generate_regex_pattern(file_format))
+
+def _format_levels_of_path(file_path, file_format):
+    """
+    Returns the last part of file_path with as many directory levels as file_format has,
+    which is the part that should match the format.
+
+    Example:
+        _format_levels_of_path("/backups/2023/05/17", "{YYYY}/{MM}/{DD}")
+        # "2023/05/17"
+    """
+    return "/".join(file_path.split("/")[-(file_format.count("/") + 1):])
+
 def generate_status_msg(status_template, original_count, current_count, group):
     return status_template.format(i=original_count - current_count + 1, j=original_count, t=group)
 
@@ -115,30 +198,52 @@ def get_file_datetime(file_path, file_format):
         file_datetime = get_file_datetime(file_path, file_format)
         # file_datetime = datetime.datetime(2023, 9, 5, 15, 30)
     """
-    regex_pattern = generate_regex_pattern(file_format)
-    match = re.search(regex_pattern, file_path)
+    match = _compiled_format_regex(file_format).fullmatch(_format_levels_of_path(file_path, file_format))
     if match:
-        try:
-            # set which components to extract from the match
-            # key:   the name of the component used in the datetime constructor (year, ...)
-            # value: the name of the group in the regex (from the --format arg) (YYYY, ...)
-            # the name of the component must be compatible with the datetime constructor
-            datetime_components = {'year': 'YYYY', 'month': 'MM', 'day': 'DD', 'hour': 'hh', 'minute': 'mm'}
-            dt = {component_name: int(match.group(component_value)) for component_name, component_value in datetime_components.items() if component_value in match.groupdict()}
-            # if the match contains YYYY, MM, DD, hh, mm, then dt will be something like this:
-            #   {'year': '2023', 'month': '09', 'day': '05', 'hour': '21', 'minute': '45'}
-            # if the match contains YYYY, MM, DD, then dt will be something like this:
-            #   {'year': '2023', 'month': '09', 'day': '05'}
-            # if a component is not present in the match, it will not be extracted
-
-            # construct a datetime object from the components and return it
-            return datetime(**dt)
-            # if a date or datetime cannot be constructed because it lacks components (for example only year and month is provided and no day), it will fail with TypeError and the function will return None
-            # if any value is out of range, it will fail with ValueError and the function will return None (for example, {'month': 13})
-        except (ValueError, TypeError):
-            return None
+        return _datetime_from_match(match)
     return None
 
+@functools.lru_cache(maxsize=32)
+def _datetime_groups(format_regex):
+    """
+    Returns the datetime constructor keywords and the names of the matching groups present in format_regex,
+    in the order of the datetime constructor arguments, and whether they can be passed to it positionally.
+
+    Example:
+        _datetime_groups(_compiled_format_regex("{DD}.{MM}.{YYYY}"))
+        # (('year', 'month', 'day'), ('YYYY', 'MM', 'DD'), True)
+    """
+    # key:   the name of the component used in the datetime constructor (year, ...)
+    # value: the name of the group in the regex (from the --format arg) (YYYY, ...)
+    # the name of the component must be compatible with the datetime constructor
+    datetime_components = {'year': 'YYYY', 'month': 'MM', 'day': 'DD', 'hour': 'hh', 'minute': 'mm'}
+    present = [(component_name, group_name) for component_name, group_name in datetime_components.items() if group_name in format_regex.groupindex]
+    component_names = tuple(component_name for component_name, _ in present)
+    group_names = tuple(group_name for _, group_name in present)
+    # positional if no component is skipped, which is the usual case. Minutes without hours, for example, must be passed by keyword
+    positional = component_names == tuple(datetime_components)[:len(component_names)]
+    return component_names, group_names, positional
+
+def _datetime_from_match(match):
+    """
+    Constructs a datetime from the YYYY, MM, DD, hh and mm groups of a match of the regex generated
+    by generate_regex_pattern. Returns None if a datetime can't be constructed from them.
+    """
+    component_names, group_names, positional = _datetime_groups(match.re)
+    if len(group_names) < 3: # year, month and day are required, so a datetime can't be constructed
+        return None
+    # fetch all groups in one call, then convert them to integers, for example
+    #   ('2023', '09', '05', '21', '45') -> 2023, 9, 5, 21, 45
+    values = map(int, match.group(*group_names))
+    try:
+        if positional:
+            return datetime(*values)
+        return datetime(**dict(zip(component_names, values)))
+        # if a date or datetime cannot be constructed because it lacks components (for example only year, month and hour is provided and no day), it will fail with TypeError and the function will return None
+        # if any value is out of range, it will fail with ValueError and the function will return None (for example, {'month': 13})
+    except (ValueError, TypeError):
+        return None
+
 def list_files(file_flags, verbose):
     """
     Prints files indicating which would be retained if a different action is chosen.
@@ -171,29 +276,32 @@ def list_files(file_flags, verbose):
     else:
         file_flags_items = sorted(file_flags.items())
         if verbose:
+            # collect the lines and print them with a single call, see below
+            lines = []
             for file, flags in file_flags_items:
-                flags_str = ", ".join(flags)
-                if flags_str:
-                    print(f"{file} - Reasons to keep: {flags_str}")
+                if flags:
+                    lines.append(f"{file} - Reasons to keep: {', '.join(flags)}")
                 else:
-                    print(f"{file} - No reason to keep")
-            print("Files with no reason to keep can be deleted or moved using --action=delete or --action=move, see --help")
+                    lines.append(f"{file} - No reason to keep")
+            lines.append("Files with no reason to keep can be deleted or moved using --action=delete or --action=move, see --help")
+            print("\n".join(lines))
         else:
-            number_of_files_to_be_kept = 0
-            number_of_files_to_be_deleted = 0
+            # partition the files in one pass, then print each list with a single call
+            files_to_be_kept = []
+            files_to_be_deleted = []
             for file, flags in file_flags_items:
                 if flags:  # One or more reason to keep the file
-                    number_of_files_to_be_kept += 1
+                    files_to_be_kept.append(file)
                 else:
-                    number_of_files_to_be_deleted += 1
-            print(f"Files to keep: {number_of_files_to_be_kept}")
-            for file, flags in file_flags_items:
-                print(file) if flags else None
-            print(f"Files to move or delete: {number_of_files_to_be_deleted}")
-            for file, flags in file_flags_items:
-                print(file) if not flags else None
-
-def move_files(file_flags, destination, verbose, test_mode=False):
+                    files_to_be_deleted.append(file)
+            print(f"Files to keep: {len(files_to_be_kept)}")
+            if files_to_be_kept:
+                print("\n".join(files_to_be_kept))
+            print(f"Files to move or delete: {len(files_to_be_deleted)}")
+            if files_to_be_deleted:
+                print("\n".join(files_to_be_deleted))
+
+def move_files(file_flags, destination, verbose, test_mode=False, jobs=1):
     """
     Moves files not to be retained to a different directory.
 
@@ -201,6 +309,8 @@ def move_files(file_flags, destination, verbose, test_mode=False):
         file_flags (dict): A dictionary containing file paths as keys and their corresponding retention flags as values.
         destination (str): The destination directory where the files will be moved.
         verbose (bool): If True, provides detailed information about each file move.
+        jobs (int): The number of files to move in parallel. If more than 1, the files are moved after they
+            have all been listed, using a pool of threads.
 
     If the destination directory exists, files not to be retained are moved to that directory.
     If the destination directory does not exist, it is created. If any errors occur during the move operation,
@@ -238,22 +348,109 @@ def move_files(file_flags, destination, verbose, test_mode=False):
                 print(msg)
                 sys.exit(1)
 
+    # the device of the destination, and of the directories the files are in (usually just one), to know
+    # if a file can be renamed into the destination directly, or if it has to be copied to another file system
+    destination_device = os.stat(destination).st_dev
+    device_of_directory = {}
+
+    # verbose output is collected here and written in one go before the next file is moved (and at the end),
+    # instead of one write per file. It's flushed before each move, so the progress is still shown
+    pending_output = []
+    files_to_move = [] # the arguments of _move_file for each file, if they are moved in parallel (jobs > 1)
     for file, flags in sorted(file_flags.items()):
         if not flags:  # No flags present for the file
-            print(f"moving {file} to {destination}...", flush=True) if verbose else None
-            shutil.move(file, destination)
-        else:
+            if verbose:
+                pending_output.append(f"moving {file} to {destination}...")
+                print("\n".join(pending_output), flush=True)
+                pending_output.clear()
+            directory = os.path.dirname(file)
+            if directory not in device_of_directory:
+                device_of_directory[directory] = os.stat(directory or os.curdir).st_dev
+            if jobs > 1:
+                files_to_move.append((file, destination, device_of_directory[directory] == destination_device))
+            else:
+                _move_file(file, destination, device_of_directory[directory] == destination_device)
+        elif verbose: # the reasons are only joined when they will be printed
             flags_str = ", ".join(flags)
-            print(f"keeping  {file} -- {flags_str}") if verbose else None
+            pending_output.append(f"keeping  {file} -- {flags_str}")
+    if pending_output:
+        print("\n".join(pending_output))
+    if files_to_move:
+        # files with the same name (like "somefile.txt" in "data_{YYYY}{MM}{DD}/somefile.txt") would be moved to the
+        # same target, and two threads could both find it free before either renames, so one would replace the other.
+        # They're moved one at a time after the others instead, so the later ones fail like they do without --jobs
+        name_counts = {}
+        for file, _, _ in files_to_move:
+            name = os.path.basename(file)
+            name_counts[name] = name_counts.get(name, 0) + 1
+        unique_names = [arguments for arguments in files_to_move if name_counts[os.path.basename(arguments[0])] == 1]
+        _run_in_threads(_move_file, unique_names, jobs)
+        for arguments in files_to_move:
+            if name_counts[os.path.basename(arguments[0])] > 1:
+                _move_file(*arguments)
+
+
+def _move_file(file, destination, same_file_system=True):
+    """
+    Moves a file or directory into the destination directory.
+
+    If it's on the same file system as the destination (the usual case), a plain os.rename is tried first,
+    which is a single system call. shutil.move is used if that fails, if the file has to be copied to another
+    file system, and if the target already exists, so it's reported the same way as before instead of being
+    overwritten by the rename.
+    """
+    target = os.path.join(destination, os.path.basename(file))
+    if same_file_system and not os.path.lexists(target):
+        try:
+            os.rename(file, target)
+            return
+        except OSError:
+            pass
+    import shutil # only imported when needed, as it's not used by the default list action
+    shutil.move(file, destination)
+
+def _run_in_threads(function, arguments, jobs):
+    """
+    Calls function with each tuple of arguments, using a pool of (at most) jobs threads.
 
+    Moving and deleting files is mostly waiting for the file system, which doesn't hold the GIL,
+    so running them in parallel helps on slow or network storage. An exception raised by function
+    is raised here, like it would be in a plain loop.
+    """
+    from concurrent.futures import ThreadPoolExecutor # only needed with --jobs
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        for _ in executor.map(lambda args: function(*args), arguments):
+            pass
+
+def _delete_file(file):
+    """
+    Deletes a file or a directory with all its contents. If it fails, an error message is printed.
 
-def delete_files(file_flags, verbose):
+    The file is removed without checking what it is first, which would cost an extra stat per file.
+    Only if that fails, it's checked whether it's a directory (os.remove raises IsADirectoryError on Linux,
+    and PermissionError on macOS and Windows), which is then removed with shutil.rmtree.
+    """
+    try:
+        try:
+            os.remove(file)
+        except FileNotFoundError: # already gone, nothing to delete
+            pass
+        except OSError:
+            if not os.path.isdir(file):
+                raise
+            import shutil # only imported when needed, see _move_file
+            shutil.rmtree(file)
+    except OSError as e:
+        print(f"Error deleting file or directory '{file}': {e}")
+
+def delete_files(file_flags, verbose, jobs=1):
     """
     Deletes files not to be retained.
 
     Args:
         file_flags (dict): A dictionary containing file paths as keys and their corresponding retention flags as values.
         verbose (bool): If True, provides detailed information about each file deletion.
+        jobs (int): The number of files to delete in parallel, see move_files.
 
     Files not to be retained are deleted from the file system. If any errors occur during the deletion process,
     an error message is printed.
@@ -270,19 +467,25 @@ def delete_files(file_flags, verbose):
         # Files not to be retained have been deleted.
 
     """
+    pending_output = [] # verbose output not written yet, see move_files
+    files_to_delete = [] # the arguments of _delete_file for each file, if they are deleted in parallel (jobs > 1)
     for file, flags in sorted(file_flags.items()):
         if not flags:  # No flags present for the file
-            print(f"deleting {file}...", flush=True) if verbose else None
-            try:
-                if os.path.isfile(file):
-                    os.remove(file)
-                elif os.path.isdir(file):
-                    shutil.rmtree(file)
-            except OSError as e:
-                print(f"Error deleting file or directory '{file}': {e}")
-        else:
+            if verbose:
+                pending_output.append(f"deleting {file}...")
+                print("\n".join(pending_output), flush=True)
+                pending_output.clear()
+            if jobs > 1:
+                files_to_delete.append((file,))
+            else:
+                _delete_file(file)
+        elif verbose: # see move_files
             flags_str = ", ".join(flags)
-            print(f"keeping  {file} -- {flags_str}") if verbose else None
+            pending_output.append(f"keeping  {file} -- {flags_str}")
+    if pending_output:
+        print("\n".join(pending_output))
+    if files_to_delete:
+        _run_in_threads(_delete_file, files_to_delete, jobs)
 
 def parse_retention(retention_string, test_mode=False):
     """
@@ -322,7 +525,8 @@ def parse_retention(retention_string, test_mode=False):
                     print(msg)
                     sys.exit(1)
         time_unit = parts[0]
-        if time_unit in ['years', 'half-years', 'quarters', 'months', 'fortnights', 'weeks', 'days', 'hours', 'latest', 'earliest', 'newest', 'oldest']:
+        # a set literal is compiled into a constant frozenset, so this is a hash lookup without building anything per call
+        if time_unit in {'years', 'half-years', 'quarters', 'months', 'fortnights', 'weeks', 'days', 'hours', 'latest', 'earliest', 'newest', 'oldest'}:
             # replace synonyms
             time_unit = time_unit.replace('oldest', 'earliest')
             time_unit = time_unit.replace('newest', 'latest')
@@ -341,6 +545,168 @@ def parse_retention(retention_string, test_mode=False):
         retention_dict = {'all', '*'}
     return retention_dict
 
+def flag_files_to_retain(file_datetime_map, file_flags, retention, method, verbose):
+    """
+    Adds the reasons to keep each file to file_flags, according to the retention configuration.
+
+    Args:
+        file_datetime_map (dict): A dictionary containing file paths as keys and their datetime as values.
+            Only files with a valid timestamp, which is not in the future, should be included.
+        file_flags (dict): A dictionary containing file paths as keys and their corresponding retention flags as values.
+            The reasons to keep the files in file_datetime_map are appended to their (initially empty) lists.
+        retention (dict): The retention configuration, as returned by parse_retention.
+        method (str): "cumulative" or "progressive", see --help_method.
+        verbose (bool): If False, only the first reason to keep a file is added, as the reasons are only printed in verbose mode.
+
+    Example:
+        file_datetime_map = {
+            'backups/20230901T0100': datetime(2023, 9, 1, 1, 0),
+            'backups/20230902T0100': datetime(2023, 9, 2, 1, 0),
+            'backups/20230903T0100': datetime(2023, 9, 3, 1, 0)
+        }
+        file_flags = {file: [] for file in file_datetime_map}
+        flag_files_to_retain(file_datetime_map, file_flags, {'latest': 2}, "cumulative", True)
+        # file_flags = {
+        #     'backups/20230901T0100': [],
+        #     'backups/20230902T0100': ['latest 2/2'],
+        #     'backups/20230903T0100': ['latest 1/2']
+        # }
+
+    """
+    files_grouped_by_nothing    = {} # the key is the file itself
+    files_grouped_by_hour       = {} # the key is Year, month, day, hour
+    files_grouped_by_day        = {} # the key is Year, month, day
+    files_grouped_by_week       = {} # the key is Year, week
+    files_grouped_by_fortnight  = {} # the key is Year, fortnight
+    files_grouped_by_month      = {} # the key is Year, month
+    files_grouped_by_quarter    = {} # the key is Year, quarter
+    files_grouped_by_half_year  = {} # the key is Year, half_year
+    files_grouped_by_year       = {} # the key is Year
+    # the value is only the latest file in each group, as that is the one that will be retained
+
+    time_units_and_files = [
+        ['latest',      files_grouped_by_nothing,   "latest {i}/{j}"                                         ],
+        ['hours',       files_grouped_by_hour,      "hour {i}/{j} ({t[0]}-{t[1]:02d}-{t[2]:02d} {t[3]:02d})" ],
+        ['days',        files_grouped_by_day,       "day {i}/{j} ({t[0]}-{t[1]:02d}-{t[2]:02d})"             ],
+        ['weeks',       files_grouped_by_week,      "week {i}/{j} ({t[0]}-W{t[1]:02d})"                      ],
+        ['fortnights',  files_grouped_by_fortnight, "fortnight {i}/{j} ({t[0]}-F{t[1]:02d})"                 ],
+        ['months',      files_grouped_by_month,     "month {i}/{j} ({t[0]}-{t[1]:02d})"                      ],
+        ['quarters',    files_grouped_by_quarter,   "quarter {i}/{j} ({t[0]}-Q{t[1]})"                       ],
+        ['half-years',  files_grouped_by_half_year, "half-year {i}/{j} ({t[0]}-H{t[1]})"                     ],
+        ['years',       files_grouped_by_year,      "year {i}/{j} ({t[0]})"                                  ]]
+
+    # functions returning the key of the group a file belongs to, for each time unit
+    # the group keys are tuples of integers taken directly from the datetime, which are cheaper
+    # to build and hash than strings formatted with strftime. The status templates above format
+    # them for display, for example (2023, 5, 17) is shown as "2023-05-17"
+    def fortnight_key(file, dt):
+        iso_year, iso_week, _ = dt.isocalendar()
+        return (iso_year, (iso_week + 1) // 2) # integer division rounding up, like math.ceil(iso_week / 2)
+
+    group_key_functions = {
+        # each file has its own group - if "latest=3" is specified, the latest 3 files will be in the first 3 groups
+        'latest':     lambda file, dt: file,
+        'hours':      lambda file, dt: (dt.year, dt.month, dt.day, dt.hour),
+        'days':       lambda file, dt: (dt.year, dt.month, dt.day),
+        # use ISO week, where the first week of the year is the week that contains 
+        # at least four days of the new year.
+        'weeks':      lambda file, dt: dt.isocalendar()[:2],
+        'fortnights': fortnight_key,
+        'months':     lambda file, dt: (dt.year, dt.month),
+        'quarters':   lambda file, dt: (dt.year, (dt.month + 2) // 3),
+        'half-years': lambda file, dt: (dt.year, (dt.month + 5) // 6),
+        'years':      lambda file, dt: (dt.year,)}
+
+    # only populate the groups of the time units the user has chosen to retain files based on
+    # "earliest" uses the same groups as "latest", it just processes them in reverse order
+    grouped_time_units = set(retention) | ({'latest'} if 'earliest' in retention else set())
+    active_groupings = [(time_unit, group_key_functions[time_unit], grouped_files)
+                        for time_unit, grouped_files, _ in time_units_and_files if time_unit in grouped_time_units]
+
+    # reverse index of the groups above, for each time unit: the key of the group each file belongs to
+    # used by cumulative retention to find the group where the previous time unit stopped without searching through the files of every group
+    group_keys_by_time_unit = {time_unit: {} for time_unit in grouped_time_units}
+
+    cumulative = method == "cumulative" # only depends on the arguments, so no need to compare it again for every group
+
+    # with the progressive method, each time unit only uses its first N groups (N being the retention count),
+    # so once every grouping has that many groups, the remaining (older) files can't be retained and the
+    # grouping can stop. Cumulative retention continues where the previous time unit stopped, and "earliest"
+    # needs the oldest files, so in those cases all files are grouped
+    stop_when_all_groups_found = not cumulative and 'earliest' not in retention
+    # the number of time units that don't have enough groups yet
+    time_units_missing_groups = sum(1 for time_unit in grouped_time_units if retention.get(time_unit, 0) > 0)
+
+    # loop through files sorted by latest file first, ensuring the latest file(s) in each group is selected for retention
+    for file, file_datetime in sorted(file_datetime_map.items(), key=itemgetter(1), reverse=True):
+        # group files, with the groups in order of their latest file, unlike file_datetime_map, which is random order
+        for time_unit, group_key_function, grouped_files in active_groupings:
+            group_key = group_key_function(file, file_datetime)
+            if group_key not in grouped_files: # as the files are sorted newest first, only the first file of each group is stored
+                grouped_files[group_key] = file
+                if len(grouped_files) == retention.get(time_unit, 0): # this time unit now has all the groups it needs
+                    time_units_missing_groups -= 1
+            group_keys_by_time_unit[time_unit][file] = group_key
+        if stop_when_all_groups_found and time_units_missing_groups == 0:
+            break
+
+    last_file_in_previous_group = None # if cumulative retention is used, the last file in the former group is stored here
+    last_group = None
+    
+    # iterate through all time units - except earliest - (as that will be progressive, even in when using the cumulative method)
+    # the reason for that is that it starts from the other end (earliest first), and adding it early in time_units_and_files would cause 
+    # last_file_in_previous_group to be set to the very last files, resulting in no other groups being processed
+    # adding it to the end would result in it never being applied if one of the other groups run out of files.
+    for time_unit, grouped_files, status_template in time_units_and_files:
+        if time_unit in retention: # if user has chosen to retain files based on this time unit
+            retention_count = original_retention_count = retention[time_unit]
+            if grouped_files:
+                last_group = next(reversed(grouped_files))  # Get the last group from the dictionary keys, without copying them to a list
+            if last_file_in_previous_group:
+                group_of_last_file_in_previous_group = group_keys_by_time_unit[time_unit][last_file_in_previous_group]
+            group_has_been_iterated_through_at_least_once = False
+            for group, current_file in grouped_files.items(): # iterate through groups with the latest file within that group
+                # examples of groups: (2017, 41) for week, (2023, 10) for month, (2023, 5, 17) for day, ...
+                if last_file_in_previous_group: # if we're using cumulative retention and the previous time unit is done
+                    # check if we've reached the group that the last file in the previous time unit was in
+                    if group == group_of_last_file_in_previous_group:
+                        last_file_in_previous_group = None # reset this so we won't go into this code block on the next iteration
+                    # then just skip to next iteration if we haven't found the file, and if we just found it
+                    continue
+                group_has_been_iterated_through_at_least_once = True
+
+                if retention_count > 0: # we still have files left in the given retention count, so we'll add it to the file_flags
+                    # the reasons to keep a file are only printed in verbose mode, otherwise one reason is enough
+                    # the group still counts towards retention_count, so the same files are retained either way
+                    if verbose or not file_flags[current_file]:
+                        status_msg = generate_status_msg(status_template, original_retention_count, retention_count, group)
+                        file_flags[current_file].append(status_msg)
+                    retention_count -= 1
+            
+                if (retention_count < 1 # no more files from this group to be added
+                or group == last_group): # ran out of files (retention_count still not 0 even at the last group
+                    if cumulative:
+                        last_file_in_previous_group = current_file # where to start processing when iterating over the next time_unit
+                    break # no point continuing with further groups in this time_unit if we've already used all of retention_count
+            if cumulative and not group_has_been_iterated_through_at_least_once: 
+                break # if you run out of files in, say, months, then there's no point processing any subsequent group (like year)
+                # this is important, otherwise the next group will get last_file_in_previous_group = None which means it'll start iterating from the first file
+
+    # flag files using the "earliest" time unit:
+    time_unit="earliest"
+    grouped_files=files_grouped_by_nothing
+    status_template="earliest {i}/{j}"
+    if time_unit in retention: # if user has chosen to retain files based on this time unit
+        retention_count = original_retention_count = retention[time_unit]
+        for group, current_file in reversed(grouped_files.items()): # iterate through groups (=files for this group) in reverse order
+            if retention_count > 0: # we still have files left in the given retention count, so we'll add it to the file_flags
+                if verbose or not file_flags[current_file]: # see above, one reason is enough unless verbose
+                    status_msg = generate_status_msg(status_template, original_retention_count, retention_count, group)
+                    file_flags[current_file].append(status_msg)
+                retention_count -= 1
+            if retention_count < 1: # no more files from this group to be added
+                break # no point continuing with further groups in this time_unit if we've already used all of retention_count
+
 def main():
     parser = argparse.ArgumentParser(description="Backup retention script")
     parser.add_argument("directory", nargs="?", default=os.getcwd(), help="Directory to process. default=current. Will attempt to create directory if it doesn't exist")
@@ -353,6 +719,7 @@ def main():
     parser.add_argument("--help_retention", action="store_true", help="display more detailed help on the retention argument")
     parser.add_argument("--method", default="cumulative", choices=["progressive", "cumulative"], help="Progressive retention retains files based on specific time intervals, starting from the most recent and extending to older files. Cumulative retention accumulates retention criteria over time, gradually expanding the range of files to be retained based on increasing time intervals. See --help-method for more details. Default=cumulative")
     parser.add_argument("--help_method", action="store_true", help="display more detailed help on the method argument")
+    parser.add_argument("--jobs", type=int, default=1, help="Number of files to move or delete in parallel. Can speed up the move and delete actions on network storage. With more than 1, the verbose output is printed before the files are moved/deleted. default=1")
 
     args = parser.parse_args()
 
@@ -453,18 +820,24 @@ Progressive retention will apply only one reason to keep a file for each file, w
         if not args.destination:
             parser.error("Destination directory required for move action")
 
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+
     retention = parse_retention(args.retention)
 
     if args.verbose:
         print("Backup retention arguments:")
         print(f"  directory: {args.directory}")
         print(f"  action: {args.action}")
-        print(f"  destination: {args.destination}") if args.destination else None
+        if args.destination:
+            print(f"  destination: {args.destination}")
         print(f"  format: {args.format}")
         print("  retention:")
         for mode, quantity in retention.items():
             print(f"    - {mode}: {quantity}")
         print(f"  method: {args.method}")
+        if args.jobs > 1:
+            print(f"  jobs: {args.jobs}")
         print("", flush=True)
 
     # exit it file pattern doesn't contain at least year, month, day and hour
@@ -474,167 +847,53 @@ Progressive retention will apply only one reason to keep a file for each file, w
         print("Error: File format must contain at least {YYYY}, {MM} and {DD}")
         sys.exit(1)
 
-    files = get_matching_files(args.directory, args.format)
+    # compile the format once, before any files are processed. It's cached, so get_matching_files will reuse it
+    # an invalid format (for example with unbalanced parentheses) is reported here instead of failing with a traceback
+    try:
+        _compiled_format_regex(args.format)
+    except re.error as e:
+        print(f"Error: Invalid file format \"{args.format}\": {e}")
+        sys.exit(1)
+
     file_datetime_map = {}
     file_flags = {}
 
-    # exit if no files are found
-    if files:
-        print(f"Found {len(files)} files matching the specified file format")
-        print("", flush=True)
-    else:
-        print("Error: No files matching the specified file format found in the specified directory. See --help if in doubt.")
-        sys.exit(1)
-
-    for file in files:
-        if "all" in retention or len(retention) == 0: # len(retention) == 0 should never occur, but better safe than sorry...
+    # both are evaluated once, rather than for every file
+    now = datetime.now() # all files are compared against the same point in time
+    retain_all = "all" in retention or len(retention) == 0 # len(retention) == 0 should never occur, but better safe than sorry...
+    # flag the files while the directory is being listed, so they're only iterated over once
+    for file, file_datetime in iter_matching_files(args.directory, args.format):
+        if retain_all:
             file_flags[file] = ["command line argument set to retain all files"]
         else:
-            file_datetime = get_file_datetime(file, args.format)
             if file_datetime: # the datetime is valid
-                if file_datetime > datetime.now(): # date/time is in the future
+                if file_datetime > now: # date/time is in the future
                     file_flags[file] = ["timestamp is in the future"]
                 else:
                     file_datetime_map[file] = file_datetime
                     file_flags[file] = [] # empty means it will be deleted unless a reason to keep it is added later
             else:
                 file_flags[file] = ["invalid timestamp"]
-        
-    # print("file_datetime_map:", file_datetime_map) # debug
-        
-    files_grouped_by_nothing    = {} # simple list of datetime, week_number, file
-    files_grouped_by_hour       = {} # the key is Year, month, day, hour
-    files_grouped_by_day        = {} # the key is Year, month, day
-    files_grouped_by_week       = {} # the key is Year, week
-    files_grouped_by_fortnight  = {} # the key is Year, fortnight
-    files_grouped_by_month      = {} # the key is Year, month
-    files_grouped_by_quarter    = {} # the key is Year, quarter
-    files_grouped_by_half_year  = {} # the key is Year, half_year
-    files_grouped_by_year       = {} # the key is Year
-
-    # loop through files sorted by latest file first, ensuring the latest file(s) in each group is selected for retention
-    for file, file_datetime in sorted(file_datetime_map.items(), key=lambda x: x[1], reverse=True):
-        # group files, internally sorted by datetime, newest first, unlike file_datetime_map, which is random order
-
-        # populate files_grouped_by_nothing - each file has its own group
-        # if "latest=3" is specified, the latest 3 files will be in the first 3 groups
-        files_grouped_by_nothing.setdefault(file, []).append(file)
 
-        # populate files_grouped_by_hour
-        hour_key = file_datetime.strftime("%Y-%m-%d %H")
-        files_grouped_by_hour.setdefault(hour_key, []).append(file)
-
-        # populate files_grouped_by_day
-        day_key = file_datetime.strftime("%Y-%m-%d")
-        files_grouped_by_day.setdefault(day_key, []).append(file)
-
-        # populate files_grouped_by_week 
-        # use ISO week, where the first week of the year is the week that contains 
-        # at least four days of the new year.
-        week_key = file_datetime.strftime("%G-W%V")
-        files_grouped_by_week.setdefault(week_key, []).append(file)
-        
-        # populate files_grouped_by_fortnight
-        iso_year, iso_week, _ = file_datetime.isocalendar()
-        fortnight = math.ceil(iso_week / 2)
-        fortnight_key = f"{iso_year}-F{str(fortnight).zfill(2)}"
-        files_grouped_by_fortnight.setdefault(fortnight_key, []).append(file)
-
-        # populate files_grouped_by_month
-        month_key = file_datetime.strftime("%Y-%m")
-        files_grouped_by_month.setdefault(month_key, []).append(file)
-
-        # populate files_grouped_by_quarter
-        quarter = math.ceil(file_datetime.month / 3)
-        quarter_key = file_datetime.strftime(f"%Y-Q{quarter}")
-        files_grouped_by_quarter.setdefault(quarter_key, []).append(file)
-
-        # populate files_grouped_by_half_year
-        half_year = math.ceil(file_datetime.month / 6)
-        half_year_key = file_datetime.strftime(f"%Y-H{half_year}")
-        files_grouped_by_half_year.setdefault(half_year_key, []).append(file)
-
-        # populate files_grouped_by_year
-        year_key = file_datetime.strftime("%Y")
-        files_grouped_by_year.setdefault(year_key, []).append(file)
-        
-    time_units_and_files = [
-        ['latest',      files_grouped_by_nothing,   "latest {i}/{j}"          ],
-        ['hours',       files_grouped_by_hour,      "hour {i}/{j} ({t})"      ],
-        ['days',        files_grouped_by_day,       "day {i}/{j} ({t})"       ],
-        ['weeks',       files_grouped_by_week,      "week {i}/{j} ({t})"      ],
-        ['fortnights',  files_grouped_by_fortnight, "fortnight {i}/{j} ({t})" ],
-        ['months',      files_grouped_by_month,     "month {i}/{j} ({t})"     ],
-        ['quarters',    files_grouped_by_quarter,   "quarter {i}/{j} ({t})"   ],
-        ['half_years',  files_grouped_by_half_year, "half-year {i}/{j} ({t})" ],
-        ['years',       files_grouped_by_year,      "year {i}/{j} ({t})"      ]]
-
-    # Create a list of the time units above that are also present as keys in the retention dictionary
-    # example of contents of retention: {'last': (3,1), 'months': (2,1), 'years': (5,1), 'weeks': (1,2), 'days': (1,3)}
-    time_units = [time_unit for time_unit, _, _ in time_units_and_files if time_unit in retention]
-    
-    # Create a list of only the grouped files for easy access (used to get next time unit's files)
-    grouped_files_by_time_unit = {unit: files for unit, files, _ in time_units_and_files}
-    
-    last_file_in_previous_group = None # if cumulative retention is used, the last file in the former group is stored here
-    last_group = None
-    
-    # iterate through all time units - except earliest - (as that will be progressive, even in when using the cumulative method)
-    # the reason for that is that it starts from the other end (earliest first), and adding it early in time_units_and_files would cause 
-    # last_file_in_previous_group to be set to the very last files, resulting in no other groups being processed
-    # adding it to the end would result in it never being applied if one of the other groups run out of files.
-    for time_unit, grouped_files, status_template in time_units_and_files:
-        if time_unit in retention: # if user has chosen to retain files based on this time unit
-            retention_count = original_retention_count = retention[time_unit]
-            if grouped_files.keys():
-                last_group = list(grouped_files.keys())[-1]  # Get the last group from the dictionary keys
-            group_has_been_iterated_through_at_least_once = False
-            for group, files in grouped_files.items(): # iterate through groups with files within that group
-                # examples of groups: "2017-W41" for week, "2023-10" for month, "20230517" for day, ...
-                if last_file_in_previous_group: # if we're using cumulative retention and the previous time unit is done
-                    # check if we've reached the group that the last file in the previous time unit was in
-                    if last_file_in_previous_group in files: 
-                        last_file_in_previous_group = None # reset this so we won't go into this code block on the next iteration
-                    # then just skip to next iteration if we haven't found the file, and if we just found it
-                    continue
-                group_has_been_iterated_through_at_least_once = True
-                current_file = files[0]
+    # exit if no files are found
+    if file_flags:
+        print(f"Found {len(file_flags)} files matching the specified file format")
+        print("", flush=True)
+    else:
+        print("Error: No files matching the specified file format found in the specified directory. See --help if in doubt.")
+        sys.exit(1)
 
-                if retention_count > 0: # we still have files left in the given retention count, so we'll add it to the file_flags
-                    status_msg = generate_status_msg(status_template, original_retention_count, retention_count, group)
-                    file_flags[current_file].append(status_msg)
-                    retention_count -= 1
-            
-                if (retention_count < 1 # no more files from this group to be added
-                or group == last_group): # ran out of files (retention_count still not 0 even at the last group
-                    if args.method == "cumulative":
-                        last_file_in_previous_group = current_file # where to start processing when iterating over the next time_unit
-                    break # no point continuing with further groups in this time_unit if we've already used all of retention_count
-            if args.method == "cumulative" and not group_has_been_iterated_through_at_least_once: 
-                break # if you run out of files in, say, months, then there's no point processing any subsequent group (like year)
-                # this is important, otherwise the next group will get last_file_in_previous_group = None which means it'll start iterating from the first file
+    # print("file_datetime_map:", file_datetime_map) # debug
 
-    # flag files using the "earliest" time unit:
-    time_unit="earliest"
-    grouped_files=files_grouped_by_nothing
-    status_template="earliest {i}/{j}"
-    if time_unit in retention: # if user has chosen to retain files based on this time unit
-        retention_count = original_retention_count = retention[time_unit]
-        for group, files in list(grouped_files.items())[::-1]: # iterate through groups (=files for this group) in reverse order
-            current_file = files[0]
-            if retention_count > 0: # we still have files left in the given retention count, so we'll add it to the file_flags
-                status_msg = generate_status_msg(status_template, original_retention_count, retention_count, group)
-                file_flags[current_file].append(status_msg)
-                retention_count -= 1
-            if retention_count < 1: # no more files from this group to be added
-                break # no point continuing with further groups in this time_unit if we've already used all of retention_count
+    if not retain_all: # if all files are retained, there is nothing to group or decide
+        flag_files_to_retain(file_datetime_map, file_flags, retention, args.method, args.verbose)
 
     if args.action=="list":
         list_files(file_flags, args.verbose)
     elif args.action=="delete":
-        delete_files(file_flags, args.verbose)
+        delete_files(file_flags, args.verbose, jobs=args.jobs)
     elif args.action=="move":
-        move_files(file_flags, args.destination, args.verbose)
+        move_files(file_flags, args.destination, args.verbose, jobs=args.jobs)
 
 
 if __name__ == "__main__":